@@ -6,169 +6,450 @@ YouTube公式APIと音声認識APIを使用した独立実装
 
 import json
 import argparse
+import io
+import os
+from html import unescape
+import orjson
 import requests
 import re
-import xml.etree.ElementTree as ET
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from urllib.parse import parse_qs, urlparse
 import time
 from pathlib import Path
+from typing import Sequence, Union
+
+# lxml があれば使用し、なければ標準ライブラリ (C実装) にフォールバック
+try:
+    from lxml import etree as ET
+    XMLParseError = ET.XMLSyntaxError
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    XMLParseError = ET.ParseError
+    HAS_LXML = False
+
+# brotli がインストールされていれば urllib3 が br を自動デコードできる
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'br, gzip, deflate'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+# requests-cache があればHTTPレスポンスをディスクにキャッシュ（Cache-Control/ETagを尊重）
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+# 正規表現は動画ごとに再利用するためモジュール読み込み時にコンパイル
+VIDEO_ID_RE = re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&\n?#]+)')
+VID_PARAM_RE = re.compile(r'v=([^&\n?#]+)')
+ID11_RE = re.compile(r'^[a-zA-Z0-9_-]{11}$')
+# ytInitialPlayerResponse の代入 (`var ... = {`) とプロパティ (`"...": {`) を1つの正規表現で探し、
+# JSON本体は raw_decode で読み取る
+YT_PLAYER_RESPONSE_RE = re.compile(r'ytInitialPlayerResponse"?\s*[:=]\s*')
+# orjson は部分文字列のデコードに対応しないため、ここだけ標準 json を使用
+JSON_DECODER = json.JSONDecoder()
+
+# 字幕取得の並列数とリクエストレート
+# 通常は制限なしで並列実行し、429 を受けた後だけ THROTTLED_REQUESTS_PER_MINUTE に抑える
+MAX_WORKERS = 8
+THROTTLED_REQUESTS_PER_MINUTE = 60
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 30
+HTTP_CACHE_PATH = 'yt_cache.sqlite'
+HTTP_CACHE_EXPIRE = 3600
+CAPTION_CACHE_PATH = 'yt_caption_cache.db'
+CAPTION_CACHE_TTL = 7 * 24 * 60 * 60
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 全リクエストで共有するセッション（keep-alive・コネクション再利用）
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    共有セッションを初回利用時に作成して返す
+    HTTPキャッシュ (HTTP_CACHE_PATH) もこの時点で開くため、import しただけではファイルを作らない
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                if requests_cache is not None:
+                    session = requests_cache.CachedSession(
+                        HTTP_CACHE_PATH, expire_after=HTTP_CACHE_EXPIRE, cache_control=True
+                    )
+                else:
+                    session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'User-Agent': USER_AGENT,
+                    'Accept-Language': 'ja,en-US;q=0.5',
+                })
+                _session = session
+    return _session
+
+class TokenBucket:
+    """
+    スレッド間で共有する適応型トークンバケット
+    throttle() が呼ばれるまでは待機せず、以降は rate 件/秒（最大 capacity 件まで連続可）に制限
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.throttled = False
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def throttle(self):
+        with self._lock:
+            if not self.throttled:
+                print(f"   ⏳ レート制限を検知: {self.rate * 60:.0f} 件/分に制限します")
+                self.throttled = True
+                self._tokens = 0.0
+                self._updated = time.monotonic()
+    
+    def acquire(self):
+        if not self.throttled:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+RATE_LIMITER = TokenBucket(THROTTLED_REQUESTS_PER_MINUTE / 60, 1)
+
+class CaptionCache:
+    """
+    字幕トラック情報（baseUrl・言語・利用可能言語）を (video_id, lang) 単位で保存するSQLiteキャッシュ
+    有効期限は baseUrl の署名の expire パラメータ（最大 ttl 秒）
+    キャッシュの読み書きに失敗しても字幕取得は継続する（キャッシュなしとして扱う）
+    """
+    
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS caption_tracks ('
+                'video_id TEXT, lang TEXT, base_url TEXT, language TEXT, language_name TEXT, '
+                'langs_json TEXT, expires_at INTEGER, PRIMARY KEY(video_id, lang))'
+            )
+        return self._conn
+    
+    def _expires_at(self, base_url: str, now: int) -> int:
+        """baseUrl の expire パラメータ（UNIX時刻）を有効期限とし、ttl を上限とする"""
+        expire = parse_qs(urlparse(base_url).query).get('expire', [''])[0]
+        if expire.isdigit():
+            return min(int(expire), now + self.ttl)
+        return now + self.ttl
+    
+    def get(self, video_id: str, lang: str) -> dict:
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT base_url, language, language_name, langs_json FROM caption_tracks '
+                    'WHERE video_id = ? AND lang = ? AND expires_at > ?',
+                    (video_id, lang, int(time.time()))
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return {
+            "base_url": row[0],
+            "language": row[1],
+            "language_name": row[2],
+            "available_languages": orjson.loads(row[3]),
+        }
+    
+    def put(self, video_id: str, lang: str, track_info: dict):
+        expires_at = self._expires_at(track_info['base_url'], int(time.time()))
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO caption_tracks VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (video_id, lang, track_info['base_url'], track_info['language'],
+                     track_info['language_name'], orjson.dumps(track_info['available_languages']).decode(),
+                     expires_at)
+                )
+        except sqlite3.Error:
+            pass
+    
+    def delete(self, video_id: str, lang: str):
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute('DELETE FROM caption_tracks WHERE video_id = ? AND lang = ?', (video_id, lang))
+        except sqlite3.Error:
+            pass
+
+CAPTION_CACHE = CaptionCache(CAPTION_CACHE_PATH, CAPTION_CACHE_TTL)
+
+def _retry_after(response: requests.Response, attempt: int) -> float:
+    """Retry-After ヘッダ（秒）があればそれを、なければ指数バックオフの待機秒数を返す"""
+    value = response.headers.get('Retry-After', '')
+    if value.isdigit():
+        return float(value)
+    return float(2 ** attempt)
+
+def fetch_with_backoff(url: str, headers: dict = None) -> requests.Response:
+    """共有セッションからGETし、429/5xx の場合のみ待機して再試行"""
+    for attempt in range(MAX_RETRIES + 1):
+        RATE_LIMITER.acquire()
+        response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 429 and response.status_code < 500:
+            return response
+        if response.status_code == 429:
+            RATE_LIMITER.throttle()
+        if attempt < MAX_RETRIES:
+            time.sleep(_retry_after(response, attempt))
+    return response
 
 def extract_video_id(url: str) -> str:
     """YouTube URLから動画IDを抽出"""
-    patterns = [
-        r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&\n?#]+)',
-        r'v=([^&\n?#]+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in (VIDEO_ID_RE, VID_PARAM_RE):
+        match = pattern.search(url)
         if match:
             return match.group(1)
     
-    return url if re.match(r'^[a-zA-Z0-9_-]{11}$', url) else None
+    return url if ID11_RE.match(url) else None
+
+def _decode_json_at(html: str, start: int) -> dict:
+    """html[start:] の先頭にあるJSONオブジェクトを1つだけ読み取る"""
+    if start < len(html) and html[start] == '{':
+        try:
+            return JSON_DECODER.raw_decode(html, start)[0]
+        except ValueError:
+            pass
+    return None
+
+def _extract_player_response(html: str) -> dict:
+    """YouTubeページのHTMLからytInitialPlayerResponseを抽出（見つからなければNone）"""
+    # JSONとして読めない出現箇所（null の代入など）は読み飛ばし、1回の走査で探す
+    for match in YT_PLAYER_RESPONSE_RE.finditer(html):
+        player_response = _decode_json_at(html, match.end())
+        if player_response is not None:
+            return player_response
+    
+    return None
 
-def get_youtube_captions(video_id: str, lang: str = 'ja') -> dict:
+def _lang_priority(lang: Union[str, Sequence[str]]) -> tuple:
+    """言語コード（単一または優先順のシーケンス）をタプルに正規化"""
+    return (lang,) if isinstance(lang, str) else tuple(lang)
+
+def _fetch_track_info(video_id: str, lang: Union[str, Sequence[str]], strict: bool = False) -> dict:
+    """
+    YouTubeページから字幕トラック情報を取得
+    lang は単一の言語コード、または優先順の言語コードのシーケンス
+    strict が True の場合、指定言語がなければ他の言語にフォールバックせずエラーを返す
+    Returns:
+        {"base_url", "language", "language_name", "available_languages"} または {"error": ...}
+    """
+    # 1. YouTubeページからytInitialPlayerResponseを取得
+    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+    headers = {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'DNT': '1',
+        'Upgrade-Insecure-Requests': '1',
+    }
+    
+    response = fetch_with_backoff(youtube_url, headers=headers)
+    response.raise_for_status()
+    
+    # ytInitialPlayerResponseの抽出
+    player_response = _extract_player_response(response.text)
+    if player_response is None:
+        return {"error": "ytInitialPlayerResponseが見つかりません"}
+    
+    # 2. captionTracksの取得
+    captions = player_response.get('captions', {})
+    caption_tracks = captions.get('playerCaptionsTracklistRenderer', {}).get('captionTracks', [])
+    
+    if not caption_tracks:
+        return {"error": "字幕が利用できません"}
+    
+    # 3. 優先順で最初に存在する言語の字幕を取得（同じ言語内では手動字幕を自動生成字幕より優先）
+    selected_track = None
+    for code in _lang_priority(lang):
+        matching_tracks = [track for track in caption_tracks if track.get('languageCode') == code]
+        if matching_tracks:
+            matching_tracks.sort(key=lambda track: track.get('kind') == 'asr')
+            selected_track = matching_tracks[0]
+            break
+    
+    # 指定言語がない場合は最初の利用可能な字幕を使用（strict 時はエラー）
+    if selected_track is None:
+        if strict:
+            return {"error": "指定言語の字幕がありません"}
+        selected_track = caption_tracks[0]
+    
+    base_url = selected_track.get('baseUrl')
+    if not base_url:
+        return {"error": "字幕URLが取得できません"}
+    
+    return {
+        "base_url": base_url,
+        "language": selected_track.get('languageCode'),
+        "language_name": selected_track.get('name', {}).get('simpleText', ''),
+        "available_languages": [
+            {
+                "code": track.get('languageCode'),
+                "name": track.get('name', {}).get('simpleText', '')
+            }
+            for track in caption_tracks
+        ]
+    }
+
+def get_youtube_captions(video_id: str, lang: Union[str, Sequence[str]] = 'ja', strict: bool = False) -> dict:
     """
     YouTube公式キャプションを取得
     拡張機能と同じメカニズムを使用
+    lang には優先順の言語コードのシーケンス（例: ('ja', 'en')）も指定できる
+    strict が True の場合、指定言語の字幕がなければ字幕XMLを取得せずエラーを返す
     """
     try:
-        # 1. YouTubeページからytInitialPlayerResponseを取得
-        youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        response = requests.get(youtube_url, headers=headers)
-        response.raise_for_status()
-        
-        # ytInitialPlayerResponseの抽出
-        pattern = r'var ytInitialPlayerResponse = ({.*?});'
-        match = re.search(pattern, response.text)
-        
-        if not match:
-            print(f"   🔍 ytInitialPlayerResponse not found, trying alternative patterns...")
-            # Alternative patterns
-            alt_patterns = [
-                r'ytInitialPlayerResponse"?:\s*({.*?}),',
-                r'ytInitialPlayerResponse\s*=\s*({.*?});',
-                r'"ytInitialPlayerResponse":({.*?}),'
-            ]
-            for alt_pattern in alt_patterns:
-                match = re.search(alt_pattern, response.text)
-                if match:
-                    print(f"   ✅ Found with alternative pattern")
-                    break
-            
-            if not match:
-                return {"error": "ytInitialPlayerResponseが見つかりません"}
-        
-        player_response = json.loads(match.group(1))
-        
-        # 2. captionTracksの取得
-        captions = player_response.get('captions', {})
-        caption_tracks = captions.get('playerCaptionsTracklistRenderer', {}).get('captionTracks', [])
-        
-        if not caption_tracks:
-            return {"error": "字幕が利用できません"}
-        
-        # 3. 指定言語または利用可能な言語の字幕を取得
-        selected_track = None
-        for track in caption_tracks:
-            if track.get('languageCode') == lang:
-                selected_track = track
-                break
-        
-        # 指定言語がない場合は最初の利用可能な字幕を使用
-        if not selected_track and caption_tracks:
-            selected_track = caption_tracks[0]
-        
-        if not selected_track:
-            return {"error": "利用可能な字幕がありません"}
-        
-        # 4. 字幕XMLの取得
-        base_url = selected_track.get('baseUrl')
-        if not base_url:
-            return {"error": "字幕URLが取得できません"}
-        
+        langs = _lang_priority(lang)
+        cache_key = ','.join(langs)
         caption_headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': '*/*',
-            'Accept-Language': 'ja,en-US;q=0.5',
             'Referer': f'https://www.youtube.com/watch?v={video_id}',
             'Origin': 'https://www.youtube.com',
         }
-        
-        caption_response = requests.get(base_url, headers=caption_headers)
-        caption_response.raise_for_status()
-        
-        # 5. XMLのパース
-        transcript_data = parse_caption_xml(caption_response.text)
+        transcript_data = None
+        
+        # キャッシュ済みの字幕URLがあればページ取得を省略
+        track_info = CAPTION_CACHE.get(video_id, cache_key)
+        if track_info and strict and track_info['language'] not in langs:
+            # キャッシュ時点で指定言語がなかった（他言語にフォールバックした）動画
+            return {"error": "指定言語の字幕がありません"}
+        if track_info:
+            caption_response = fetch_with_backoff(track_info['base_url'], headers=caption_headers)
+            if caption_response.ok:
+                transcript_data = parse_caption_xml(caption_response.text)
+            if transcript_data is None or not transcript_data['text']:
+                # 署名付きURLの期限切れ・空の応答: キャッシュを破棄して通常の手順で取り直す
+                CAPTION_CACHE.delete(video_id, cache_key)
+                transcript_data = None
+        
+        if transcript_data is None:
+            track_info = _fetch_track_info(video_id, langs, strict)
+            if 'error' in track_info:
+                return track_info
+            
+            # 4. 字幕XMLの取得
+            caption_response = fetch_with_backoff(track_info['base_url'], headers=caption_headers)
+            caption_response.raise_for_status()
+            
+            # 5. XMLのパース（中身のある字幕が取れたURLだけキャッシュする）
+            transcript_data = parse_caption_xml(caption_response.text)
+            if transcript_data['text']:
+                CAPTION_CACHE.put(video_id, cache_key, track_info)
         
         return {
             "success": True,
             "video_id": video_id,
-            "language": selected_track.get('languageCode'),
-            "language_name": selected_track.get('name', {}).get('simpleText', ''),
+            "language": track_info['language'],
+            "language_name": track_info['language_name'],
             "transcript": transcript_data['text'],
             "timed_transcript": transcript_data['timed'],
-            "available_languages": [
-                {
-                    "code": track.get('languageCode'),
-                    "name": track.get('name', {}).get('simpleText', '')
-                }
-                for track in caption_tracks
-            ]
+            "available_languages": track_info['available_languages']
         }
         
     except Exception as e:
         return {"error": f"字幕取得エラー: {str(e)}"}
 
+def _timed(starts: list, durations: list, texts: list) -> dict:
+    """タイムスタンプ付きデータ（列ごとの配列で保持し、キーの繰り返しを避ける）"""
+    return {"starts": starts, "durations": durations, "texts": texts}
+
 def parse_caption_xml(xml_content: str) -> dict:
     """字幕XMLをパースしてテキストとタイムスタンプ付きデータを生成"""
     try:
         if not xml_content.strip():
-            return {"text": "", "timed": [], "error": "Empty XML content"}
+            return {"text": "", "timed": _timed([], [], []), "error": "Empty XML content"}
         
-        root = ET.fromstring(xml_content)
+        starts = []
+        durations = []
+        texts = []
         
-        timed_transcript = []
-        full_text = []
-        
-        for text_elem in root.findall('text'):
-            start_time = float(text_elem.get('start', 0))
-            duration = float(text_elem.get('dur', 0))
-            text_content = text_elem.text or ''
+        # iterparseで<text>要素を逐次処理し、処理済み要素は解放する
+        source = io.BytesIO(xml_content.encode('utf-8'))
+        if HAS_LXML:
+            events = ET.iterparse(source, events=('end',), tag='text')
+        else:
+            # 標準ライブラリでは start イベントからルート要素を取得し、処理済みの子要素を切り離す
+            events = ET.iterparse(source, events=('start', 'end'))
+        root = None
+        
+        for event, text_elem in events:
+            if root is None and not HAS_LXML:
+                root = text_elem
+            if event != 'end' or text_elem.tag != 'text':
+                continue
             
+            starts.append(float(text_elem.get('start', 0)))
+            durations.append(float(text_elem.get('dur', 0)))
             # HTMLエンティティのデコード
-            text_content = text_content.replace('&amp;', '&')
-            text_content = text_content.replace('&lt;', '<')
-            text_content = text_content.replace('&gt;', '>')
-            text_content = text_content.replace('&quot;', '"')
-            text_content = text_content.replace('&#39;', "'")
-            
-            # タイムスタンプ付きデータ
-            timed_transcript.append({
-                "start": start_time,
-                "duration": duration,
-                "text": text_content.strip()
-            })
+            texts.append(unescape(text_elem.text or '').strip())
             
-            full_text.append(text_content.strip())
+            text_elem.clear()
+            if HAS_LXML:
+                while text_elem.getprevious() is not None:
+                    del text_elem.getparent()[0]
+            else:
+                root.clear()
         
         return {
-            "text": ' '.join(full_text),
-            "timed": timed_transcript
+            "text": ' '.join(texts),
+            "timed": _timed(starts, durations, texts)
         }
         
-    except ET.ParseError as e:
-        return {"text": "", "timed": [], "error": f"XML解析エラー: {str(e)}"}
+    except XMLParseError as e:
+        return {"text": "", "timed": _timed([], [], []), "error": f"XML解析エラー: {str(e)}"}
+
+def _transcript_to_timed(transcript_data) -> tuple:
+    """youtube-transcript-apiの結果を (全文, タイムスタンプ付きデータ) に変換"""
+    # 要素の形式は先頭要素で一度だけ判定し、ループ内での分岐を避ける
+    first = next(iter(transcript_data))
+    # 欠けている項目は text='' / start=0 / duration=0 として扱う
+    if hasattr(first, 'text'):
+        # 新しいAPIの FetchedTranscriptSnippet オブジェクト
+        get = lambda item: (getattr(item, 'text', ''), getattr(item, 'start', 0), getattr(item, 'duration', 0))
+    elif isinstance(first, dict):
+        # 従来形式の辞書
+        get = lambda item: (item.get('text', ''), item.get('start', 0), item.get('duration', 0))
+    else:
+        # 予期しない形式
+        texts = [str(item) for item in transcript_data]
+        return ' '.join(texts), _timed([0] * len(texts), [0] * len(texts), texts)
+    
+    texts, starts, durations = map(list, zip(*map(get, transcript_data)))
+    return ' '.join(texts), _timed(starts, durations, texts)
 
 def get_fallback_transcript(video_id: str) -> dict:
     """
@@ -183,119 +464,44 @@ def get_fallback_transcript(video_id: str) -> dict:
         # 利用可能な言語を取得
         transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
         
-        available_transcripts = []
-        for transcript in transcript_list:
-            available_transcripts.append({
+        available_transcripts = [
+            {
                 'language_code': transcript.language_code,
                 'language': transcript.language,
                 'is_generated': transcript.is_generated,
                 'is_translatable': transcript.is_translatable
-            })
+            }
+            for transcript in transcript_list
+        ]
         
         print(f"   🔍 Available transcripts: {available_transcripts}")
         
-        # 日本語を直接取得→翻訳版を試行
+        # 日本語→英語の優先順で字幕を取得（取得済みの transcript_list を再利用）
         try:
-            print(f"   🔍 Trying Japanese transcript...")
-            # まず利用可能な transcript をリストアップ
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            
-            # 日本語字幕を取得
-            ja_transcript = transcript_list.find_transcript(['ja'])
-            transcript_data = ja_transcript.fetch()
+            print(f"   🔍 Trying ja/en transcript...")
+            transcript = transcript_list.find_transcript(['ja', 'en'])
+            transcript_data = transcript.fetch()
             
             # 新しいAPIバージョンに対応した処理
             if hasattr(transcript_data, '__iter__') and len(transcript_data) > 0:
-                # APIのレスポンスを適切に処理
-                full_text_parts = []
-                timed_data = []
-                
-                for item in transcript_data:
-                    if hasattr(item, 'text'):
-                        # 新しいAPIの FetchedTranscriptSnippet オブジェクト
-                        text = item.text
-                        start = getattr(item, 'start', 0)
-                        duration = getattr(item, 'duration', 0)
-                        
-                        full_text_parts.append(text)
-                        timed_data.append({
-                            "text": text,
-                            "start": start,
-                            "duration": duration
-                        })
-                    elif isinstance(item, dict):
-                        # 従来形式の辞書
-                        text = item.get('text', '')
-                        full_text_parts.append(text)
-                        timed_data.append(item)
-                    else:
-                        # 予期しない形式
-                        text = str(item)
-                        full_text_parts.append(text)
-                        timed_data.append({"text": text})
-                
-                full_text = ' '.join(full_text_parts)
+                full_text, timed_data = _transcript_to_timed(transcript_data)
             else:
                 full_text = str(transcript_data)
-                timed_data = [{"text": full_text}]
+                timed_data = _timed([0], [0], [full_text])
             
-            print(f"   ✅ Japanese transcript success: {len(full_text)} chars, {len(timed_data)} segments")
+            print(f"   ✅ {transcript.language_code} transcript success: {len(full_text)} chars, {len(timed_data['texts'])} segments")
             
             return {
                 "success": True,
                 "video_id": video_id,
-                "language": 'ja',
+                "language": transcript.language_code,
                 "transcript": full_text,
                 "timed_transcript": timed_data,
                 "source": "youtube-transcript-api"
             }
             
         except Exception as e:
-            print(f"   ❌ Japanese transcript failed: {str(e)}")
-            
-        # もう一度シンプルなAPIを試行
-        try:
-            print(f"   🔍 Trying simple get_transcript...")
-            transcript_data = YouTubeTranscriptApi.get_transcript(video_id, languages=['ja'])
-            
-            # データ形式を統一
-            if transcript_data and isinstance(transcript_data[0], dict):
-                # 従来の辞書形式
-                full_text = ' '.join([item['text'] for item in transcript_data])
-                timed_data = transcript_data
-            else:
-                # 新しい形式
-                full_text_parts = []
-                timed_data = []
-                
-                for item in transcript_data:
-                    if hasattr(item, 'text'):
-                        text = item.text
-                        start = getattr(item, 'start', 0)
-                        duration = getattr(item, 'duration', 0)
-                        
-                        full_text_parts.append(text)
-                        timed_data.append({
-                            "text": text,
-                            "start": start,
-                            "duration": duration
-                        })
-                
-                full_text = ' '.join(full_text_parts)
-            
-            print(f"   ✅ Simple transcript success: {len(full_text)} chars, {len(timed_data)} segments")
-            
-            return {
-                "success": True,
-                "video_id": video_id,
-                "language": 'ja',
-                "transcript": full_text,
-                "timed_transcript": timed_data,
-                "source": "youtube-transcript-api (simple)"
-            }
-            
-        except Exception as e:
-            print(f"   ❌ Simple transcript failed: {str(e)}")
+            print(f"   ❌ ja/en transcript failed: {str(e)}")
         
         return {"error": "フォールバック字幕取得も失敗"}
         
@@ -331,12 +537,71 @@ def generate_summary_prompt(transcript: str, title: str = "") -> str:
 """
     return prompt
 
-def process_video_transcripts(input_file: str, output_file: str = None, top_n: int = 10, lang: str = 'ja'):
-    """動画リストから字幕を取得して要約プロンプトを生成"""
+def fetch_video_captions(video_id: str, lang: Union[str, Sequence[str]] = 'ja', strict: bool = False) -> dict:
+    """1動画分の字幕を取得（公式字幕 → フォールバック）"""
+    caption_result = get_youtube_captions(video_id, lang, strict)
     
-    # 入力ファイルの読み込み
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if not caption_result.get('success') or caption_result.get('transcript', '') == '':
+        print(f"   ⚠️ [{video_id}] 公式字幕取得失敗: {caption_result.get('error', 'Empty transcript')}")
+        print(f"   🔄 [{video_id}] フォールバック字幕取得を試行中...")
+        # youtube-transcript-api は独自にHTTPを発行するため、ここでレート制限を適用
+        RATE_LIMITER.acquire()
+        caption_result = get_fallback_transcript(video_id)
+    
+    return caption_result
+
+class TranscriptResultWriter:
+    """
+    処理結果のJSONを1動画ずつファイルへ書き出す（全件をメモリに保持しない）
+    書き込み中は <path>.part に出力し、正常終了した場合のみ path を置き換える
+    """
+    
+    def __init__(self, path: str, processed_at: str, lang: str):
+        self.path = path
+        self.partial_path = f"{path}.part"
+        self._f = open(self.partial_path, 'wb')
+        self._count = 0
+        self._f.write(
+            b'{\n  "processed_at": ' + orjson.dumps(processed_at)
+            + b',\n  "target_language": ' + orjson.dumps(lang)
+            + b',\n  "videos": ['
+        )
+    
+    def write(self, result: dict):
+        body = orjson.dumps(result, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n    ')
+        self._f.write((b',\n    ' if self._count else b'\n    ') + body)
+        self._f.flush()
+        self._count += 1
+    
+    def close(self, total: int, successful: int, completed: bool = True):
+        """
+        配列とオブジェクトを閉じる（途中終了時も読めるJSONとして残す）
+        completed が False の場合は元の出力ファイルを残し、途中結果は <path>.part に置く
+        """
+        try:
+            self._f.write(
+                b'\n  ],\n  "total_videos": ' + orjson.dumps(total)
+                + b',\n  "successful_transcripts": ' + orjson.dumps(successful)
+                + b'\n}'
+            )
+        finally:
+            self._f.close()
+        if completed:
+            os.replace(self.partial_path, self.path)
+
+def process_video_transcripts(input_file: Union[str, Path, list, dict], output_file: str = None, top_n: int = 10,
+                              lang: str = 'ja', max_workers: int = MAX_WORKERS):
+    """
+    動画リストから字幕を取得して要約プロンプトを生成
+    input_file には入力JSONファイルのパス、または読み込み済みのデータを指定できる
+    """
+    
+    # 入力ファイルの読み込み（読み込み済みならそのまま使用）
+    if isinstance(input_file, (str, Path)):
+        with open(input_file, 'rb') as f:
+            data = orjson.loads(f.read())
+    else:
+        data = input_file
     
     # データが配列の場合の処理
     if isinstance(data, list):
@@ -344,73 +609,90 @@ def process_video_transcripts(input_file: str, output_file: str = None, top_n: i
     else:
         videos = data.get('videos', [])[:top_n]
     
-    results = []
+    processed_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    total = 0
+    successful = 0
+    
+    # 出力ファイルがあれば1件ずつ書き出し、なければメモリ上に保持
+    writer = TranscriptResultWriter(output_file, processed_at, lang) if output_file else None
+    results = None if writer else []
     
     print(f"🎬 {len(videos)} 件の動画から字幕を取得中...")
     
-    for i, video in enumerate(videos, 1):
-        video_id = video.get('videoId', '')
-        title = video.get('title', '')
-        
-        print(f"\n{i}/{len(videos)}: {title}")
-        print(f"   動画ID: {video_id}")
-        
-        # 字幕取得（メイン）
-        caption_result = get_youtube_captions(video_id, lang)
-        
-        # フォールバック
-        if not caption_result.get('success') or caption_result.get('transcript', '') == '':        print(f"   ⚠️ 公式字幕取得失敗: {caption_result.get('error', 'Empty transcript')}")
-        print(f"   🔄 フォールバック字幕取得を試行中...")
-        caption_result = get_fallback_transcript(video_id)
-        
-        if caption_result.get('success'):
-            transcript = caption_result['transcript']
-            print(f"   ✅ 字幕取得成功 ({len(transcript)} 文字)")
+    # 中断時に未実行の取得をキャンセルできるよう、executor は with を使わず管理する
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    completed = False
+    try:
+        # 字幕取得は並列実行し、結果は入力順に処理
+        caption_results = executor.map(
+            lambda v: fetch_video_captions(v.get('videoId', ''), lang), videos
+        )
+        
+        for i, (video, caption_result) in enumerate(zip(videos, caption_results), 1):
+            video_id = video.get('videoId', '')
+            title = video.get('title', '')
             
-            # 要約プロンプト生成
-            summary_prompt = generate_summary_prompt(transcript, title)
+            print(f"\n{i}/{len(videos)}: {title}")
+            print(f"   動画ID: {video_id}")
             
-            # 結果の構築
-            result = {
-                **video,  # 元の動画情報
-                "caption_data": caption_result,
-                "summary_prompt": summary_prompt,
-                "transcript_length": len(transcript),
-                "processed_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+            if caption_result.get('success'):
+                transcript = caption_result['transcript']
+                print(f"   ✅ 字幕取得成功 ({len(transcript)} 文字)")
+                
+                # 要約プロンプト生成
+                summary_prompt = generate_summary_prompt(transcript, title)
+                
+                # 結果の構築
+                result = {
+                    **video,  # 元の動画情報
+                    "caption_data": caption_result,
+                    "summary_prompt": summary_prompt,
+                    "transcript_length": len(transcript),
+                    "processed_at": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+                
+            else:
+                print(f"   ❌ 字幕取得失敗: {caption_result.get('error')}")
+                result = {
+                    **video,
+                    "caption_data": caption_result,
+                    "summary_prompt": None,
+                    "transcript_length": 0,
+                    "processed_at": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
             
-        else:
-            print(f"   ❌ 字幕取得失敗: {caption_result.get('error')}")
-            result = {
-                **video,
-                "caption_data": caption_result,
-                "summary_prompt": None,
-                "transcript_length": 0,
-                "processed_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-        
-        results.append(result)
-        
-        # レート制限対策
-        time.sleep(1)
+            total += 1
+            if result['transcript_length'] > 0:
+                successful += 1
+            
+            if writer:
+                writer.write(result)
+            else:
+                results.append(result)
+        completed = True
+    finally:
+        # 例外・中断時は待機中の取得をキャンセルし、実行中の取得の完了を待たずに抜ける
+        executor.shutdown(wait=False, cancel_futures=True)
+        # 例外・中断時も出力中のJSONを閉じる
+        if writer:
+            writer.close(total, successful, completed)
+            if not completed:
+                print(f"\n⚠️ 処理が中断されました。途中結果: {writer.partial_path}")
     
     # 結果の保存
     output_data = {
-        "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "total_videos": len(results),
-        "successful_transcripts": len([r for r in results if r.get('transcript_length', 0) > 0]),
+        "processed_at": processed_at,
+        "total_videos": total,
+        "successful_transcripts": successful,
         "target_language": lang,
-        "videos": results
     }
     
-    if output_file:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+    if writer:
         print(f"\n✅ 結果を保存: {output_file}")
+    else:
+        output_data["videos"] = results
     
     # 統計表示
-    successful = output_data['successful_transcripts']
-    total = output_data['total_videos']
     print(f"\n📊 処理結果:")
     print(f"   総動画数: {total}")
     print(f"   字幕取得成功: {successful}")
@@ -482,8 +764,8 @@ def interactive_mode():
         print("まず main.py を実行して動画データを生成してください。")
         return
     
-    with open(default_input, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(default_input, 'rb') as f:
+        data = orjson.loads(f.read())
     
     if isinstance(data, list):
         total_videos = len(data)
@@ -549,7 +831,8 @@ def interactive_mode():
     print("\\n🚀 処理を開始します...")
     
     output_file = f"transcripts_{selected_lang}_{process_count}videos.json"
-    results = process_video_transcripts(default_input, output_file, process_count, selected_lang)
+    # 読み込み済みのデータを渡し、同じファイルを再度パースしない
+    results = process_video_transcripts(data, output_file, process_count, selected_lang)
     
     # 結果サマリー
     successful = results['successful_transcripts']
@@ -664,28 +947,25 @@ def generate_legacy_url_list(input_file: str, top_n: int, output_file: str):
     print("⚠️  レガシーモードで実行中...")
     print("新機能を使用するには --interactive または通常モードを使用してください。")
     
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(input_file, 'rb') as f:
+        data = orjson.loads(f.read())
     
     if isinstance(data, list):
         videos = data[:top_n]
     else:
         videos = data.get('videos', [])[:top_n]
     
-    url_list = []
-    for video in videos:
-        video_id = video.get('videoId', '')
-        title = video.get('title', '')
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        url_list.append({
-            "title": title,
-            "url": url,
-            "video_id": video_id
-        })
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(url_list, f, ensure_ascii=False, indent=2)
+    url_list = [
+        {
+            "title": video.get('title', ''),
+            "url": f"https://www.youtube.com/watch?v={video.get('videoId', '')}",
+            "video_id": video.get('videoId', '')
+        }
+        for video in videos
+    ]
+    
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(url_list, option=orjson.OPT_INDENT_2))
     
     print(f"✅ URLリスト生成完了: {output_file}")
     print(f"📊 {len(url_list)} 件のURLを出力")
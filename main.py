@@ -1,24 +1,27 @@
 #!/usr/bin/env python3
 
 import argparse
+import heapq
 import json
 import os
 import sys
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from operator import itemgetter
+from typing import List, Dict, Any, Optional
 
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from tqdm import tqdm
-from youtube_transcript_api import (
-    YouTubeTranscriptApi,
-    TranscriptsDisabled,
-    NoTranscriptFound,
-    CouldNotRetrieveTranscript,
-)
+
+from generate_urls import fetch_video_captions
+
+# 字幕取得の並列数
+TRANSCRIPT_WORKERS = 8
+
 
 # --------------------------------------------------------------------------- #
 #                         YouTube Data API helper class                       #
@@ -70,8 +73,11 @@ class YouTubeClient:
         return video_ids
 
     # 3. videos.list で likeCount など統計情報を取得
-    def fetch_video_stats(self, video_ids: List[str]) -> List[Dict[str, Any]]:
+    def fetch_video_stats(
+        self, video_ids: List[str], top_n: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         stats: List[Dict[str, Any]] = []
+        _int = int  # 内包表記内のグローバル参照を避ける
         pbar = tqdm(total=len(video_ids), desc="Fetching statistics", unit="videos")
         for i in range(0, len(video_ids), 50):
             chunk = video_ids[i : i + 50]
@@ -80,54 +86,69 @@ class YouTubeClient:
                 part="snippet,statistics", id=",".join(chunk), maxResults=50
             )
             resp = req.execute()
-            for v in resp["items"]:
-                s = v["statistics"]
-                stats.append(
-                    {
-                        "videoId": v["id"],
-                        "title": v["snippet"]["title"],
-                        "published_at": v["snippet"]["publishedAt"],
-                        "likes": int(s.get("likeCount", 0)),
-                        "views": int(s.get("viewCount", 0)),
-                        "url": f"https://www.youtube.com/watch?v={v['id']}",
-                    }
-                )
-                pbar.update(1)
+            rows = [
+                {
+                    "videoId": v["id"],
+                    "title": v["snippet"]["title"],
+                    "published_at": v["snippet"]["publishedAt"],
+                    "likes": _int(v["statistics"].get("likeCount", 0)),
+                    "views": _int(v["statistics"].get("viewCount", 0)),
+                    "url": f"https://www.youtube.com/watch?v={v['id']}",
+                }
+                for v in resp["items"]
+            ]
+            stats.extend(rows)
+            pbar.update(len(rows))
         pbar.close()
         # likes 降順 → views 降順 → 公開日昇順
-        stats.sort(
-            key=lambda x: (-x["likes"], -x["views"], x["published_at"])
-        )
+        if top_n is not None:
+            # 上位 N 件だけ必要なら全件ソートせずヒープで取り出す
+            return heapq.nsmallest(
+                top_n, stats, key=lambda x: (-x["likes"], -x["views"], x["published_at"])
+            )
+        # 安定ソートを優先度の低いキーから重ねる（キー関数は C 実装の itemgetter）
+        stats.sort(key=itemgetter("published_at"))
+        stats.sort(key=itemgetter("views"), reverse=True)
+        stats.sort(key=itemgetter("likes"), reverse=True)
         return stats
 
 
 # --------------------------------------------------------------------------- #
 #                          Transcript helper function                         #
 # --------------------------------------------------------------------------- #
-def fetch_transcript(video_id: str, lang_priority=("ja", "en")) -> List[Dict[str, Any]]:
+def fetch_transcript(video_id: str, lang_priority=("ja", "en")) -> Dict[str, List[Any]]:
+    """
+    generate_urls と同じ経路（視聴ページ 1 回 + timedtext 1 回）で字幕を取得する
+    公式字幕が取得できない場合は youtube-transcript-api にフォールバックする
+    Returns:
+        {'starts': [1.23, ...], 'durations': [3.4, ...], 'texts': ['...', ...]}
+        各リストが空の場合は字幕なし
     """
+    # 優先順で最初に存在する言語を選び、各言語内では手動字幕 → 自動生成の順に選ばれる
+    # strict: 候補言語がない動画では字幕XMLを取得しない
+    result = fetch_video_captions(video_id, lang_priority, strict=True)
+    if result.get("success") and result.get("transcript"):
+        return result["timed_transcript"]
+    if "error" in result:
+        print(f"Warning: Failed to fetch transcript for video {video_id}: {result['error']}")
+    return {"starts": [], "durations": [], "texts": []}
+
+
+def fetch_transcripts(video_ids: List[str], max_workers: int = TRANSCRIPT_WORKERS) -> List[Dict[str, List[Any]]]:
+    """
+    複数動画の字幕を並列に取得する
     Returns:
-        [{'start': 1.23, 'duration': 3.4, 'text': '...'}, ...]
-        空リストの場合は字幕なし
+        video_ids と同じ順序の fetch_transcript() の結果リスト
     """
+    # 中断時に残りの取得を待たないよう、executor は with を使わず管理する
+    executor = ThreadPoolExecutor(max_workers=max_workers)
     try:
-        transcripts = YouTubeTranscriptApi.list_transcripts(video_id)
-        # 1) 手動字幕優先 2) 自動生成
-        for lang in lang_priority:
-            try:
-                return transcripts.find_manually_created_transcript([lang]).fetch()
-            except (NoTranscriptFound, TranscriptsDisabled):
-                try:
-                    return transcripts.find_generated_transcript([lang]).fetch()
-                except (NoTranscriptFound, TranscriptsDisabled):
-                    continue
-    except (TranscriptsDisabled, CouldNotRetrieveTranscript):
-        pass
-    except Exception as e:
-        # 予期しないエラー（XMLパースエラーなど）をキャッチして継続
-        print(f"Warning: Failed to fetch transcript for video {video_id}: {e}")
-        pass
-    return []
+        results = executor.map(fetch_transcript, video_ids)
+        return list(
+            tqdm(results, total=len(video_ids), desc="Fetching transcripts", unit="videos")
+        )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 # --------------------------------------------------------------------------- #
@@ -148,6 +169,13 @@ def main():
         action="store_true",
         help="Skip fetching transcripts (faster, cheaper)",
     )
+    ap.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=None,
+        help="Keep only the top N videos by likes (default: all)",
+    )
     ap.add_argument(
         "--throttle-ms",
         type=int,
@@ -175,13 +203,12 @@ def main():
     if not video_ids:
         sys.exit("No videos found.")
 
-    stats = yt.fetch_video_stats(video_ids)
+    stats = yt.fetch_video_stats(video_ids, top_n=args.top)
 
     if not args.no_transcript:
-        pbar = tqdm(stats, desc="Fetching transcripts", unit="videos")
-        for item in pbar:
-            item["transcript"] = fetch_transcript(item["videoId"])
-        pbar.close()
+        transcripts = fetch_transcripts([item["videoId"] for item in stats])
+        for item, transcript in zip(stats, transcripts):
+            item["transcript"] = transcript
 
     with open(args.output, "w", encoding="utf-8") as f:
         json.dump(stats, f, ensure_ascii=False, indent=2)